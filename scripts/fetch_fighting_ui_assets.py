@@ -3,18 +3,32 @@ import os
 import re
 import sys
 import json
-import time
 import shutil
+import threading
+from concurrent.futures import Future, ThreadPoolExecutor
 from dataclasses import dataclass, asdict
-from typing import List, Dict, Optional
+from typing import List, Dict, Optional, Tuple
 
 try:
     import requests
     from bs4 import BeautifulSoup  # type: ignore
+    from requests.adapters import HTTPAdapter
+    from urllib3.util.retry import Retry
 except Exception as exc:  # pragma: no cover
     print("Missing dependencies. Please run: pip install requests beautifulsoup4", file=sys.stderr)
     sys.exit(2)
 
+try:
+    import orjson  # type: ignore
+except ImportError:  # pragma: no cover
+    orjson = None
+
+try:
+    import lxml  # type: ignore  # noqa: F401
+    HTML_PARSER = "lxml"
+except ImportError:  # pragma: no cover
+    HTML_PARSER = "html.parser"
+
 
 BASE_DIR = "/workspace/assets/fighting_ui"
 DOWNLOAD_DIRS = {
@@ -27,11 +41,61 @@ DOWNLOAD_DIRS = {
 }
 
 
+PAGE_WORKERS = 4
+DOWNLOAD_WORKERS = 8
+COPY_CHUNK_SIZE = 1 << 18
+WRITE_BUFFER_SIZE = 1 << 20
+
+
+# Direct files hosted by OGA: the path check is case-sensitive, the extension is not.
+_ATTACH_PATH_RE = re.compile(r"/sites/default/files/")
+_ATTACH_EXT_RE = re.compile(r"\.(zip|7z|png|gif|svg|ttf|otf|wav|ogg)$", re.I)
+
+_SANITIZE_RE = re.compile(r"[^A-Za-z0-9._-]+")
+_LICENSE_RE = re.compile(r"License", re.I)
+
+# The extension settles most font files without scanning the name at all.
+_EXT_CATEGORIES = {".ttf": "fonts", ".otf": "fonts"}
+
+# Checked in order; the first category whose tokens appear in the name wins.
+_CATEGORY_PATTERNS = tuple(
+    (category, re.compile("|".join(re.escape(token) for token in tokens)))
+    for category, tokens in (
+        ("icons", ("icon", "glyph", "button")),
+        ("fx", ("spark", "hit", "impact", "fx", "explosion")),
+        ("backgrounds", ("background", "bg", "backdrop")),
+        ("fonts", ("font", ".ttf", ".otf")),
+    )
+)
+
+
 HEADERS = {
     "User-Agent": "AssetFetcher/1.0 (+https://example.local)"
 }
 
 
+def make_session() -> requests.Session:
+    # One keep-alive session so every OGA page and attachment reuses the same
+    # TCP/TLS connection instead of handshaking per request.
+    session = requests.Session()
+    session.headers.update(HEADERS)
+    retries = Retry(total=3, backoff_factor=0.5, status_forcelist=[429, 500, 502, 503, 504])
+    # Size the pool to every worker that can hold a connection at once, and block
+    # rather than open throwaway connections that urllib3 would discard.
+    adapter = HTTPAdapter(
+        pool_connections=4,
+        pool_maxsize=PAGE_WORKERS + DOWNLOAD_WORKERS,
+        pool_block=True,
+        max_retries=retries,
+    )
+    session.mount("https://", adapter)
+    session.mount("http://", adapter)
+    return session
+
+
+SESSION = make_session()
+
+
 @dataclass
 class AssetRecord:
     title: str
@@ -43,25 +107,33 @@ class AssetRecord:
     category: str
 
 
+_stdout_lock = threading.Lock()
+
+
+def log(message: str) -> None:
+    # Pool threads share stdout; one locked write per line keeps lines whole.
+    with _stdout_lock:
+        sys.stdout.write(message + "\n")
+
+
 def ensure_dirs() -> None:
     for path in DOWNLOAD_DIRS.values():
         os.makedirs(path, exist_ok=True)
 
 
 def sanitize_filename(name: str) -> str:
-    cleaned = re.sub(r"[^A-Za-z0-9._-]+", "-", name).strip("-")
+    cleaned = _SANITIZE_RE.sub("-", name).strip("-")
     return cleaned or "asset"
 
 
 def http_get(url: str) -> requests.Response:
-    resp = requests.get(url, headers=HEADERS, timeout=30)
+    resp = SESSION.get(url, timeout=30)
     resp.raise_for_status()
     return resp
 
 
-def parse_oga_item(page_url: str) -> Dict[str, Optional[str]]:
-    resp = http_get(page_url)
-    soup = BeautifulSoup(resp.text, "html.parser")
+def _parse_soup(html: str, page_url: str) -> Dict[str, Optional[str]]:
+    soup = BeautifulSoup(html, HTML_PARSER)
 
     title_el = soup.find("h1")
     title = title_el.get_text(strip=True) if title_el else page_url
@@ -75,7 +147,7 @@ def parse_oga_item(page_url: str) -> Dict[str, Optional[str]]:
             break
     if not license_text:
         # Fallback older layout
-        lic_block = soup.find(string=re.compile(r"License", re.I))
+        lic_block = soup.find(string=_LICENSE_RE)
         license_text = lic_block.strip() if isinstance(lic_block, str) else ""
 
     # Author
@@ -90,7 +162,7 @@ def parse_oga_item(page_url: str) -> Dict[str, Optional[str]]:
         href = a["href"]
         if href.startswith("/"):
             href = "https://opengameart.org" + href
-        if re.search(r"/sites/default/files/", href) and re.search(r"\.(zip|7z|png|gif|svg|ttf|otf|wav|ogg)$", href, re.I):
+        if _ATTACH_PATH_RE.search(href) and _ATTACH_EXT_RE.search(href):
             attachments.append(href)
 
     attachments = list(dict.fromkeys(attachments))  # dedupe preserve order
@@ -103,69 +175,166 @@ def parse_oga_item(page_url: str) -> Dict[str, Optional[str]]:
     }
 
 
+def parse_oga_item(page_url: str) -> Dict[str, Optional[str]]:
+    # Runs on the page pool, so parsing one page overlaps the next page's fetch.
+    resp = http_get(page_url)
+    return _parse_soup(resp.text, page_url)
+
+
 def download_file(url: str, dest_path: str) -> None:
-    with requests.get(url, headers=HEADERS, stream=True, timeout=60) as r:
+    with SESSION.get(url, stream=True, timeout=60) as r:
         r.raise_for_status()
-        with open(dest_path, "wb") as f:
-            for chunk in r.iter_content(chunk_size=8192):
-                if chunk:
-                    f.write(chunk)
+        # Copy straight from the socket in large blocks; iter_content's 8 KiB
+        # chunks cost a Python round-trip per chunk on big zip/7z attachments.
+        r.raw.decode_content = True
+        # Write beside the target and rename on success, so dest_path only ever
+        # holds a finished download that is_up_to_date can trust.
+        part_path = dest_path + ".part"
+        try:
+            with open(part_path, "wb", buffering=WRITE_BUFFER_SIZE) as f:
+                shutil.copyfileobj(r.raw, f, length=COPY_CHUNK_SIZE)
+            os.replace(part_path, dest_path)
+        except BaseException:
+            try:
+                os.remove(part_path)
+            except OSError:
+                pass
+            raise
+
+
+def is_up_to_date(url: str, dest_path: str) -> bool:
+    # A previous run already fetched this file if the sizes agree; a HEAD is far
+    # cheaper than re-downloading the attachment.
+    try:
+        local_size = os.path.getsize(dest_path)
+        head = SESSION.head(url, allow_redirects=True, timeout=30)
+    except (OSError, requests.RequestException):
+        return False
+    if not head.ok or "Content-Encoding" in head.headers:
+        return False
+    remote_size = head.headers.get("Content-Length")
+    return remote_size is not None and remote_size.isdigit() and int(remote_size) == local_size
 
 
 def choose_category_from_filename(filename: str) -> str:
     lower = filename.lower()
-    if any(k in lower for k in ["icon", "icons", "glyph", "button"]):
-        return "icons"
-    if any(k in lower for k in ["spark", "hit", "impact", "fx", "explosion"]):
-        return "fx"
-    if any(k in lower for k in ["background", "bg", "backdrop"]):
-        return "backgrounds"
-    if any(k in lower for k in ["font", ".ttf", ".otf"]):
-        return "fonts"
+    category = _EXT_CATEGORIES.get(os.path.splitext(lower)[1])
+    if category:
+        return category
+    for category, pattern in _CATEGORY_PATTERNS:
+        if pattern.search(lower):
+            return category
     return "ui"
 
 
-def fetch_and_store(page_url: str, manifest: List[AssetRecord]) -> None:
-    meta = parse_oga_item(page_url)
-    title = meta["title"] or page_url
-    license_text = meta["license"] or ""
-    author = meta["author"]
-    attachments: List[str] = meta.get("attachments", [])  # type: ignore
+def attachment_destination(att_url: str) -> Tuple[str, str]:
+    filename = sanitize_filename(os.path.basename(att_url.split("?")[0]))
+    category = choose_category_from_filename(filename)
+    dest_dir = DOWNLOAD_DIRS.get(category) or DOWNLOAD_DIRS["ui"]
+    return os.path.join(dest_dir, filename), category
+
+
+def download_attachment(att_url: str, dest_path: str, category: str, title: str,
+                        label: str) -> Optional[Tuple[str, str]]:
+    try:
+        if is_up_to_date(att_url, dest_path):
+            log(f"Up to date {title} [{label}]: {att_url}")
+        else:
+            log(f"Downloading {title} [{label}]: {att_url}")
+            download_file(att_url, dest_path)
+    except Exception as exc:  # pragma: no cover
+        log(f"Failed to download {att_url}: {exc}")
+        return None
+
+    return dest_path, category
+
+
+# Runs downloads on a shared pool, keyed on destination path so each file is
+# written by exactly one URL even when several sanitize to the same name.
+class DownloadQueue:
+
+    def __init__(self, pool: ThreadPoolExecutor) -> None:
+        self._pool = pool
+        self._lock = threading.Lock()
+        self._claims: Dict[str, Tuple[str, "Future[Optional[Tuple[str, str]]]"]] = {}
+
+    def submit(self, att_url: str, title: str,
+               label: str) -> Tuple[str, "Future[Optional[Tuple[str, str]]]"]:
+        dest_path, category = attachment_destination(att_url)
+        with self._lock:
+            claim = self._claims.get(dest_path)
+            if claim is None:
+                future = self._pool.submit(download_attachment, att_url, dest_path, category, title, label)
+                claim = self._claims[dest_path] = (att_url, future)
+        source_url = claim[0]
+        if source_url != att_url:
+            log(f"Skipping {att_url}: {dest_path} already holds {source_url}")
+        return claim
+
+
+def fetch_page(page_url: str) -> Optional[Dict]:
+    try:
+        meta = parse_oga_item(page_url)
+    except Exception as exc:  # pragma: no cover
+        log(f"Error processing {page_url}: {exc}")
+        return None
+    meta["title"] = meta["title"] or page_url
+    meta["license"] = meta["license"] or ""
+    title = meta["title"]
+    license_text = meta["license"]
 
     # Only accept permissive licenses: CC0 or Public Domain
     lic_lower = license_text.lower()
     is_permissive = ("cc0" in lic_lower) or ("public domain" in lic_lower) or ("pd" in lic_lower)
     if not is_permissive:
-        print(f"Skipping due to license (not CC0/PD): {title} -> {license_text}")
-        return
+        log(f"Skipping due to license (not CC0/PD): {title} -> {license_text}")
+        return None
 
-    if not attachments:
-        print(f"No attachments found on: {page_url}")
-        return
+    if not meta.get("attachments"):
+        log(f"No attachments found on: {page_url}")
+        return None
+    return meta
 
-    for idx, att_url in enumerate(attachments, start=1):
-        filename = sanitize_filename(os.path.basename(att_url.split("?")[0]))
-        category = choose_category_from_filename(filename)
-        dest_dir = DOWNLOAD_DIRS.get(category, DOWNLOAD_DIRS["ui"])
-        dest_path = os.path.join(dest_dir, filename)
 
-        try:
-            print(f"Downloading {title} [{idx}/{len(attachments)}]: {att_url}")
-            download_file(att_url, dest_path)
-        except Exception as exc:  # pragma: no cover
-            print(f"Failed to download {att_url}: {exc}")
-            continue
+def queue_page(meta: Dict, downloads: DownloadQueue) -> List[Tuple[str, Tuple[str, Future]]]:
+    attachments: List[str] = meta["attachments"]
+    return [
+        (att_url, downloads.submit(att_url, meta["title"], f"{idx}/{len(attachments)}"))
+        for idx, att_url in enumerate(attachments, start=1)
+    ]
+
 
-        rec = AssetRecord(
-            title=title,
+def collect_page(page_url: str, meta: Dict,
+                 queued: List[Tuple[str, Tuple[str, Future]]]) -> List[AssetRecord]:
+    records: List[AssetRecord] = []
+    for att_url, (source_url, future) in queued:
+        # A different URL owns this file, so it is not this attachment's bytes.
+        if source_url != att_url:
+            continue
+        stored = future.result()
+        if stored is None:
+            continue
+        dest_path, category = stored
+        records.append(AssetRecord(
+            title=meta["title"],
             source_url=page_url,
             download_url=att_url,
-            license=license_text,
-            author=author,
+            license=meta["license"],
+            author=meta["author"],
             file_path=dest_path,
             category=category,
-        )
-        manifest.append(rec)
+        ))
+    return records
+
+
+def write_manifest(manifest_path: str, result: List[Dict]) -> None:
+    # orjson produces the same indented UTF-8 output as json.dump, only faster.
+    if orjson is not None:
+        with open(manifest_path, "wb") as f:
+            f.write(orjson.dumps(result, option=orjson.OPT_INDENT_2))
+        return
+    with open(manifest_path, "w", encoding="utf-8") as f:
+        json.dump(result, f, indent=2, ensure_ascii=False)
 
 
 def main() -> int:
@@ -185,13 +354,22 @@ def main() -> int:
 
     manifest: List[AssetRecord] = []
 
-    for page in pages:
-        try:
-            fetch_and_store(page, manifest)
-            time.sleep(0.5)
-        except Exception as exc:  # pragma: no cover
-            print(f"Error processing {page}: {exc}")
-            continue
+    # Pages and attachments are network-bound, so overlap them on thread pools.
+    # Rate limiting is left to the session's Retry, which backs off on 429.
+    try:
+        with ThreadPoolExecutor(max_workers=DOWNLOAD_WORKERS) as download_pool, \
+                ThreadPoolExecutor(max_workers=PAGE_WORKERS) as page_pool:
+            downloads = DownloadQueue(download_pool)
+            # Pages parse concurrently but queue their downloads in `pages` order,
+            # so the same URL claims a contested path on every run.
+            queued = []
+            for page_url, meta in zip(pages, page_pool.map(fetch_page, pages)):
+                if meta is not None:
+                    queued.append((page_url, meta, queue_page(meta, downloads)))
+            for page_url, meta, pending in queued:
+                manifest.extend(collect_page(page_url, meta, pending))
+    finally:
+        SESSION.close()
 
     # Filter to likely free licenses (CC0, public domain). Keep others but mark.
     result: List[Dict] = []
@@ -200,9 +378,8 @@ def main() -> int:
 
     os.makedirs(DOWNLOAD_DIRS["attribution"], exist_ok=True)
     manifest_path = os.path.join(DOWNLOAD_DIRS["attribution"], "manifest.json")
-    with open(manifest_path, "w", encoding="utf-8") as f:
-        json.dump(result, f, indent=2, ensure_ascii=False)
-    print(f"Wrote manifest: {manifest_path} ({len(result)} items)")
+    write_manifest(manifest_path, result)
+    log(f"Wrote manifest: {manifest_path} ({len(result)} items)")
     return 0
 
 
@@ -0,0 +1,152 @@
+#!/usr/bin/env python3
+import json
+import os
+import re
+import sys
+import tempfile
+import threading
+import time
+import unittest
+from concurrent.futures import ThreadPoolExecutor
+from typing import List
+from unittest import mock
+
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+from bs4 import BeautifulSoup  # type: ignore  # noqa: E402
+
+import fetch_fighting_ui_assets as fetcher  # noqa: E402
+
+
+SAMPLE_PAGE = """<html><head>
+<link href="/sites/default/files/g.png" rel="icon">
+<script>var s = '<a href="/sites/default/files/h.png">x</a>';</script>
+</head><body>
+<h1>Sample Pack</h1>
+<div class="field-name-field-art-licenses"><div class="field-item">CC0</div></div>
+<div class="submitted"><a rel="author" href="/users/someone">Someone</a></div>
+<a href="/sites/default/files/a.png">relative</a>
+<a href='https://opengameart.org/sites/default/files/b.ZIP'>absolute, upper ext</a>
+<a href=/sites/default/files/unq.png>unquoted</a>
+<a href="/sites/default/files/big&amp;x.zip">entity</a>
+<a href="/sites/default/files/a.png">duplicate</a>
+<a data-href="/sites/default/files/i.png">data-href only</a>
+<a href="/SITES/DEFAULT/FILES/upper.png">upper path</a>
+<a href="/sites/default/files/readme.txt">wrong ext</a>
+<a href="/sites/default/files/c.png?itok=1">query string</a>
+<!-- <a href="/sites/default/files/commented.zip">old</a> -->
+<a>no href</a>
+</body></html>
+"""
+
+
+def baseline_attachments(html: str) -> List[str]:
+    # The original find_all walk, kept verbatim as the reference behaviour.
+    soup = BeautifulSoup(html, "html.parser")
+    attachments: List[str] = []
+    for a in soup.find_all("a", href=True):
+        href = a["href"]
+        if href.startswith("/"):
+            href = "https://opengameart.org" + href
+        if re.search(r"/sites/default/files/", href) and re.search(r"\.(zip|7z|png|gif|svg|ttf|otf|wav|ogg)$", href, re.I):
+            attachments.append(href)
+    return list(dict.fromkeys(attachments))
+
+
+class ParseSoupTest(unittest.TestCase):
+    def test_attachments_match_baseline_find_all(self) -> None:
+        meta = fetcher._parse_soup(SAMPLE_PAGE, "https://opengameart.org/content/sample")
+        self.assertEqual(meta["attachments"], baseline_attachments(SAMPLE_PAGE))
+        self.assertEqual(meta["attachments"], [
+            "https://opengameart.org/sites/default/files/a.png",
+            "https://opengameart.org/sites/default/files/b.ZIP",
+            "https://opengameart.org/sites/default/files/unq.png",
+            "https://opengameart.org/sites/default/files/big&x.zip",
+        ])
+
+    def test_page_metadata(self) -> None:
+        meta = fetcher._parse_soup(SAMPLE_PAGE, "https://opengameart.org/content/sample")
+        self.assertEqual(meta["title"], "Sample Pack")
+        self.assertEqual(meta["license"], "CC0")
+        self.assertEqual(meta["author"], "Someone")
+
+
+def page_meta(title: str, author: str, attachments: List[str]) -> dict:
+    return {"title": title, "license": "CC0", "author": author, "attachments": attachments}
+
+
+class DownloadQueueTest(unittest.TestCase):
+    def setUp(self) -> None:
+        self.tmp = tempfile.TemporaryDirectory()
+        self.addCleanup(self.tmp.cleanup)
+        dirs = {key: os.path.join(self.tmp.name, key) for key in fetcher.DOWNLOAD_DIRS}
+        for patcher in (mock.patch.dict(fetcher.DOWNLOAD_DIRS, dirs), mock.patch.object(fetcher, "log")):
+            patcher.start()
+            self.addCleanup(patcher.stop)
+
+        self.fetched: List[str] = []
+        self.fetched_lock = threading.Lock()
+
+        def fake_download(att_url, dest_path, category, title, label):
+            with self.fetched_lock:
+                self.fetched.append(att_url)
+            return dest_path, category
+
+        patcher = mock.patch.object(fetcher, "download_attachment", side_effect=fake_download)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+        pool = ThreadPoolExecutor(max_workers=2)
+        self.addCleanup(pool.shutdown)
+        self.queue = fetcher.DownloadQueue(pool)
+
+    def test_cross_linked_url_downloads_once_and_credits_both_pages(self) -> None:
+        url = "https://opengameart.org/sites/default/files/shared.png"
+        meta_a = page_meta("A pack", "Alice", [url])
+        meta_b = page_meta("B pack", "Bob", [url])
+        queued_a = fetcher.queue_page(meta_a, self.queue)
+        queued_b = fetcher.queue_page(meta_b, self.queue)
+
+        records = fetcher.collect_page("pA", meta_a, queued_a) + fetcher.collect_page("pB", meta_b, queued_b)
+        self.assertEqual(self.fetched, [url])
+        self.assertEqual([(r.title, r.author, r.download_url) for r in records],
+                         [("A pack", "Alice", url), ("B pack", "Bob", url)])
+
+    def test_colliding_url_gets_no_record_for_another_urls_file(self) -> None:
+        url_a = "https://opengameart.org/sites/default/files/big x.zip"
+        url_b = "https://opengameart.org/sites/default/files/big&x.zip"
+        self.assertEqual(fetcher.attachment_destination(url_a), fetcher.attachment_destination(url_b))
+        meta_a = page_meta("A pack", "Alice", [url_a])
+        meta_b = page_meta("B pack", "Bob", [url_b])
+        queued_a = fetcher.queue_page(meta_a, self.queue)
+        queued_b = fetcher.queue_page(meta_b, self.queue)
+
+        self.assertEqual(self.queue.submit(url_b, "B pack", "1/1")[0], url_a)
+        records_a = fetcher.collect_page("pA", meta_a, queued_a)
+        records_b = fetcher.collect_page("pB", meta_b, queued_b)
+        self.assertEqual(self.fetched, [url_a])
+        self.assertEqual([(r.author, r.download_url) for r in records_a], [("Alice", url_a)])
+        self.assertEqual(records_b, [])
+
+    def test_main_claims_contested_paths_in_page_order(self) -> None:
+        first_url = "https://opengameart.org/sites/default/files/big x.zip"
+        later_url = "https://opengameart.org/sites/default/files/big&x.zip"
+
+        def fake_parse(page_url):
+            if page_url.endswith("kenney-ui-pack"):
+                time.sleep(0.2)  # the first page finishes parsing last
+                return page_meta("First", "Alice", [first_url])
+            return page_meta(page_url.rsplit("/", 1)[-1], "Bob", [later_url])
+
+        with mock.patch.object(fetcher, "parse_oga_item", side_effect=fake_parse), \
+                mock.patch.object(fetcher, "SESSION"):
+            self.assertEqual(fetcher.main(), 0)
+
+        manifest_path = os.path.join(fetcher.DOWNLOAD_DIRS["attribution"], "manifest.json")
+        with open(manifest_path, encoding="utf-8") as f:
+            manifest = json.load(f)
+        self.assertEqual(self.fetched, [first_url])
+        self.assertEqual([(r["title"], r["download_url"]) for r in manifest], [("First", first_url)])
+
+
+if __name__ == "__main__":
+    unittest.main()